@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# Benchmarks for enrich.py. Usage: python bench.py {filters,dates,pipeline,http-cache} [-h]
+import os, re, glob, json, time, random, argparse, tempfile, threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from xml.sax.saxutils import escape
+from dateutil import parser as dtparse
+import feedparser
+import enrich
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# ---------- synthetic entries ----------
+TITLE_BITS = {
+    "npb":     ["阪神 vs 巨人", "広島が接戦を制す", "予告先発", "スタメン発表", "試合結果", "ドラフト指名", "コラム：虎の逆襲"],
+    "jleague": ["浦和 vs 川崎F", "第28節 プレビュー", "試合ハイライト", "移籍情報", "横浜FM 新戦力", "イベント告知"],
+    "keiba":   ["セントライト記念 出走表", "枠順確定", "最終追い切り", "レース結果", "馬主インタビュー", "特集：名馬列伝"],
+    "mlb":     ["ドジャース vs パドレス", "大谷 先発", "ラインナップ発表", "試合速報", "トレード情報", "グルメ特集"],
+}
+
+def synthetic_entries(n, seed=1):
+    rnd = random.Random(seed)
+    sports = list(TITLE_BITS)
+    out = []
+    for i in range(n):
+        sport = sports[i % len(sports)]
+        bits = TITLE_BITS[sport]
+        out.append((sport, f"{rnd.choice(bits)} {rnd.choice(bits)} #{i}", f"（要約）{rnd.choice(bits)}"))
+    return out
+
+# ---------- filters ----------
+def legacy_looks_like_match(cfg, sport, title, summary):
+    # per-entry compile + one search per pattern (pre-engine implementation, kept for comparison)
+    root = cfg.get("filters") or {}
+    flt = (cfg.get("sports") or {}).get(sport, {})
+    inc = [re.compile(p, re.IGNORECASE) for p in flt.get("include", [])]
+    exc = [re.compile(p, re.IGNORECASE) for p in flt.get("exclude", [])]
+    if root.get("mode", "off") != "match_only":
+        return True
+    text = f"{title} {summary}"
+    if inc and not any(r.search(text) for r in inc):
+        return False
+    if exc and any(r.search(text) for r in exc):
+        return False
+    if sport in ("npb","mlb","jleague") and not re.search(r"\bvs\b|対|試合|スタメン|先発|ハイライト|結果|スコア", text, re.I):
+        return False
+    if sport == "keiba" and not re.search(r"出走|枠順|結果|払戻|確定|レース|予想", text):
+        return False
+    return True
+
+def bench_filters(args):
+    cfg = enrich.load_config(os.path.join(ROOT, "config.json"))
+    entries = synthetic_entries(args.n)
+
+    t = time.perf_counter()
+    before = [legacy_looks_like_match(cfg, s, ti, su) for s, ti, su in entries]
+    t_before = time.perf_counter() - t
+
+    t = time.perf_counter()
+    engine = enrich.build_filters(cfg)
+    after = [enrich.passes_filters(engine, s, ti, su) for s, ti, su in entries]
+    t_after = time.perf_counter() - t
+
+    assert before == after, "filter engine disagrees with legacy filters"
+    print(f"filters: {len(entries)} entries, {sum(after)} kept")
+    print(f"  legacy  {len(entries)/t_before:12,.0f} entries/sec")
+    print(f"  engine  {len(entries)/t_after:12,.0f} entries/sec  ({t_before/t_after:.1f}x)")
+
+# ---------- dates ----------
+def legacy_normalize_dt(dt_str):
+    # generic dateutil parse for every string (pre-fast-path implementation)
+    if not dt_str:
+        return None
+    try:
+        dt = dtparse.parse(dt_str)
+        if not dt.tzinfo:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(enrich.JST)
+    except Exception:
+        return None
+
+def _rate(fn, values, rounds):
+    t = time.perf_counter()
+    for _ in range(rounds):
+        out = [fn(v) for v in values]
+    return out, len(values) * rounds / (time.perf_counter() - t)
+
+def _normalize_cold(v):
+    enrich.normalize_dt.cache_clear()
+    return enrich.normalize_dt(v)
+
+def bench_dates(args):
+    # default: archived enrich.py outputs (dist/ of 2025-09-02), frozen because dist/ is
+    # rewritten by every run; RSS written by our own writer, not publisher payloads
+    paths = args.fixtures or sorted(glob.glob(os.path.join(ROOT, "fixtures", "*.xml")))
+    entries = [e for p in paths for e in feedparser.parse(p).entries]
+    if not entries:
+        raise SystemExit("no entries in fixtures: " + ", ".join(paths))
+    raw = [e.get("published") or e.get("updated") for e in entries]
+    # ISO 8601 inputs are synthesized: the same instants re-serialized with isoformat()
+    iso = [d.isoformat() if d else None for d in map(legacy_normalize_dt, raw)]
+    rounds = max(1, args.n // len(entries))
+
+    print(f"dates: {len(entries)} entries from {len(paths)} fixture(s) x {rounds} rounds")
+    for label, values in (("RFC 822", raw), ("ISO 8601", iso)):
+        before, r_before = _rate(legacy_normalize_dt, values, rounds)
+        # cold = cache cleared before every parse, memoized = repeated strings
+        _, r_cold = _rate(_normalize_cold, values, rounds)
+        after, r_warm = _rate(enrich.normalize_dt, values, rounds)
+        assert before == after, f"{label}: fast path disagrees with dateutil"
+        print(f"  {label:9} dateutil {r_before:12,.0f}/s   fast {r_cold:12,.0f}/s   memoized {r_warm:12,.0f}/s")
+    structs, r_struct = _rate(enrich.entry_dt, entries, rounds)
+    assert structs == [legacy_normalize_dt(v) for v in raw], "struct_time path disagrees with dateutil"
+    print(f"  struct_time (entry_dt)           {r_struct:12,.0f}/s")
+
+# ---------- full pipeline over synthetic feeds ----------
+DEMO_TITLES = {
+    "npb":     ["阪神 vs 巨人 きょう18:00 先発発表","広島が接戦を制す、終盤で逆転","パ・リーグ投手戦 注目ポイント"],
+    "jleague": ["浦和 vs 川崎F プレビュー","神戸、首位攻防戦を制す","横浜FM 新戦力が躍動"],
+    "keiba":   ["セントライト記念 展望","重賞トリプルトレンド：注目馬3頭","今週の追い切り評価"],
+    "mlb":     ["ドジャース 大谷がマルチ安打","パドレス ダルビッシュ復帰登板","カブス 鈴木誠也が決勝打"],
+}
+
+def write_fixture(path, fmt, sport, n_entries, seed):
+    """One synthetic feed: Atom (ISO 8601 dates) or RSS 2.0 (RFC 822 dates)."""
+    rnd = random.Random(seed)
+    words = TITLE_BITS[sport] + DEMO_TITLES[sport]
+    # recent dates, so the near-duplicate window (near_dup.recent_hours) applies as in production
+    base = datetime.now(enrich.JST).replace(second=0, microsecond=0)
+    parts = []
+    for i in range(n_entries):
+        title = escape(f"{rnd.choice(words)}　{rnd.choice(words)}（{seed}-{i}）")
+        summary = escape("、".join(rnd.choice(words) for _ in range(4)) + "。")
+        link = f"https://example.com/{sport}/{seed}/{i}.html"
+        when = base - timedelta(minutes=rnd.randrange(60 * 24 * 3))
+        if fmt == "atom":
+            parts.append(f"<entry><title>{title}</title><link href='{link}'/><id>{link}</id>"
+                         f"<updated>{when.isoformat()}</updated><summary>{summary}</summary></entry>")
+        else:
+            parts.append(f"<item><title>{title}</title><link>{link}</link><guid>{link}</guid>"
+                         f"<pubDate>{format_datetime(when)}</pubDate><description>{summary}</description></item>")
+    if fmt == "atom":
+        doc = ("<?xml version='1.0' encoding='utf-8'?><feed xmlns='http://www.w3.org/2005/Atom'>"
+               f"<title>{sport}</title>{''.join(parts)}</feed>")
+    else:
+        doc = ("<?xml version='1.0' encoding='utf-8'?><rss version='2.0'><channel>"
+               f"<title>{sport}</title>{''.join(parts)}</channel></rss>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(doc)
+
+def make_fixtures(dirpath, n_feeds, n_entries):
+    sports = list(TITLE_BITS)
+    feeds = []
+    for k in range(n_feeds):
+        sport, fmt = sports[k % len(sports)], ("atom", "rss")[k % 2]
+        name = f"{k:04d}-{sport}.xml"
+        write_fixture(os.path.join(dirpath, name), fmt, sport, n_entries, k)
+        feeds.append({"name": name, "sport": sport, "file": name, "target_url": f"https://example.com/bet/{sport}"})
+    return feeds
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128   # default 5 overflows under concurrent fetches (1s SYN retries)
+
+def serve(dirpath):
+    """Serve dirpath on an ephemeral localhost port; returns (server, base_url)."""
+    httpd = _Server(("127.0.0.1", 0), partial(_QuietHandler, directory=dirpath))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+
+def bench_pipeline(args):
+    cfg = enrich.load_config(os.path.join(ROOT, "config.json"))
+    work = args.dir or tempfile.mkdtemp(prefix="enrich-bench-")
+    fixtures = os.path.join(work, "fixtures")
+    os.makedirs(fixtures, exist_ok=True)
+    t = time.perf_counter()
+    feeds = make_fixtures(fixtures, args.feeds, args.entries)
+    print(f"pipeline: {args.feeds} feeds x {args.entries} entries in {fixtures} "
+          f"(generated in {time.perf_counter() - t:.1f}s)")
+
+    httpd = None
+    if args.http:
+        httpd, base = serve(fixtures)
+    for f in feeds:
+        f["url"] = f"{base}/{f['file']}" if httpd else os.path.join(fixtures, f["file"])
+    cfg["feeds"] = feeds
+
+    http_cache = {}
+    seen_index = enrich.SeenIndex(os.path.join(work, "seen.sqlite"))
+    try:
+        for run in range(1, args.runs + 1):
+            enrich.PROFILE.reset()
+            t = time.perf_counter()
+            items = enrich.collect_items(cfg, http_cache, seen_index, args.per_sport)
+            enrich.write_feeds(enrich.feed_sinks(cfg, os.path.join(work, "dist")), items,
+                               enrich.sport_registry(cfg), "", args.per_sport)
+            enrich.PROFILE.add("total", time.perf_counter() - t)
+            report = enrich.PROFILE.report()
+            print(f"\nrun {run} ({'cold' if run == 1 else 'warm: HTTP cache + seen-index populated'})")
+            for name, st in report["stages"].items():
+                print(f"  {name:17} {st['sec']*1000:10.1f} ms  n={st['n']}")
+            print(f"  counters: {json.dumps(report['counters'])}")
+            if "peak_rss_bytes" in report:
+                print(f"  peak RSS: {report['peak_rss_bytes'] / 2**20:.1f} MiB")
+            if args.json:
+                with open(f"{args.json}.run{run}.json" if args.runs > 1 else args.json, "w") as f:
+                    json.dump(report, f, indent=2)
+            if args.http and run > 1:
+                assert report["counters"].get("http_304") == len(feeds), "warm run re-downloaded feeds"
+    finally:
+        seen_index.close()
+        if httpd:
+            httpd.shutdown()
+
+# ---------- conditional GET against a local HTTP stand-in ----------
+def check_http_cache(args):
+    """Asserts the fetch_all reuse paths: 304, unchanged body hash, eviction of removed feeds."""
+    work = tempfile.mkdtemp(prefix="enrich-http-")
+    feeds = make_fixtures(work, args.feeds, args.entries)
+    httpd, base = serve(work)
+    for f in feeds:
+        f["url"] = f"{base}/{f['file']}"
+    cfg = {"feeds": feeds, "fetch": {"parse_workers": 0}}
+    cache = {}
+
+    def run(label):
+        enrich.PROFILE.reset()
+        out = enrich.fetch_all(cfg, cache)
+        counters = enrich.PROFILE.counters
+        print(f"  {label:15} {json.dumps({k: counters.get(k, 0) for k in ('http_304', 'body_unchanged')})}")
+        return out, counters
+
+    try:
+        print(f"http-cache: {len(feeds)} feeds x {args.entries} entries via {base}")
+        cold, c = run("cold")
+        assert all(len(e) == args.entries for e in cold), "cold run lost entries"
+        assert not c.get("http_304") and not c.get("body_unchanged"), "cold run hit the cache"
+        assert all(cache[f["url"]]["modified"] for f in feeds), "Last-Modified not recorded"
+
+        warm, c = run("304")
+        assert c.get("http_304") == len(feeds), "unchanged feeds were not answered with 304"
+        assert warm == cold, "304 reuse returned different entries"
+
+        # newer mtime, same bytes: the server answers 200 and the body hash must match
+        later = time.time() + 60
+        for f in feeds:
+            os.utime(os.path.join(work, f["file"]), (later, later))
+        same, c = run("same body")
+        assert c.get("body_unchanged") == len(feeds) and not c.get("http_304"), "unchanged body was re-parsed"
+        assert same == cold, "body-hash reuse returned different entries"
+
+        # new content on one feed: parsed again, the rest still 304
+        write_fixture(os.path.join(work, feeds[0]["file"]), "atom", feeds[0]["sport"], 3, 999)
+        later += 60
+        os.utime(os.path.join(work, feeds[0]["file"]), (later, later))
+        fresh, c = run("one changed")
+        assert len(fresh[0]) == 3 and c.get("http_304") == len(feeds) - 1, "changed feed was not re-parsed"
+
+        path = os.path.join(work, "http.json")
+        removed = cfg["feeds"].pop()
+        enrich.save_http_cache(path, cache, cfg)
+        kept = enrich.load_http_cache(path)
+        assert removed["url"] not in kept, "removed feed was not evicted"
+        assert set(kept) == {f["url"] for f in cfg["feeds"]}, "live feeds missing from the saved cache"
+        print(f"  evicted         {removed['url']}")
+        print("ok")
+    finally:
+        httpd.shutdown()
+
+def main():
+    ap = argparse.ArgumentParser(description="enrich.py micro-benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("filters", help="match-only filters: legacy vs precompiled engine")
+    p.add_argument("-n", type=int, default=20000, help="number of synthetic entries")
+    p.set_defaults(func=bench_filters)
+    p = sub.add_parser("dates", help="normalize_dt: dateutil vs fast paths over feed files")
+    p.add_argument("fixtures", nargs="*", help="feed files (default: fixtures/*.xml)")
+    p.add_argument("-n", type=int, default=50000, help="approximate number of parses per variant")
+    p.set_defaults(func=bench_dates)
+    p = sub.add_parser("pipeline", help="fetch -> parse -> filter -> dedup -> sort -> render over synthetic feeds")
+    p.add_argument("--feeds", type=int, default=100)
+    p.add_argument("--entries", type=int, default=500, help="entries per feed")
+    p.add_argument("--http", action="store_true", help="serve fixtures from a local HTTP server instead of files")
+    p.add_argument("--runs", type=int, default=2, help="repeat to measure the warm (cached) path")
+    p.add_argument("--per-sport", type=int, default=enrich.PER_SPORT_CAP_DEFAULT)
+    p.add_argument("--dir", help="working directory to keep fixtures/outputs (default: temp dir)")
+    p.add_argument("--json", metavar="FILE", help="also write each run's profile report as JSON")
+    p.set_defaults(func=bench_pipeline)
+    p = sub.add_parser("http-cache", help="assert 304 / unchanged-body reuse and eviction against a local server")
+    p.add_argument("--feeds", type=int, default=6)
+    p.add_argument("--entries", type=int, default=20, help="entries per feed")
+    p.set_defaults(func=check_http_cache)
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,126 @@
 #!/usr/bin/env python3
-import os, json, hashlib, argparse, time, re
-from datetime import datetime, timedelta
+import os, sys, json, hashlib, argparse, time, re, heapq, operator, queue, signal, sqlite3, threading, unicodedata, urllib.request, zlib
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import lru_cache
+from contextlib import contextmanager
+from xml.sax.saxutils import escape as xml_escape, quoteattr
 from dateutil import parser as dtparse
-import pytz, feedparser
-from feedgen.feed import FeedGenerator
+import feedparser
+from feedparser import http as fp_http
 
 # ---------------- Tunables ----------------
 TITLE_MAX = 70                     # max chars shown in item title
 DESC_MAX  = 120                    # max chars shown in item description
 PER_SPORT_CAP_DEFAULT = 3          # items per sport per run (anti-spam)
-JST = pytz.timezone("Asia/Tokyo")
+FETCH_CONCURRENCY = 8              # parallel feed downloads (config: fetch.concurrency)
+FETCH_TIMEOUT = 20                 # seconds per socket op (config: fetch.timeout, feed.timeout)
+FETCH_DEADLINE = 60                # seconds per feed overall, DNS included (config: fetch.deadline, feed.deadline)
+PARSE_WORKERS = 2                  # processes for large feeds, 0 = parse in threads
+PARSE_PROCESS_MIN_BYTES = 512_000  # bodies at least this big go to the process pool
+SEEN_LIVE_HOURS = 48               # items stay in the feeds this long after first seen
+SEEN_TTL_DAYS = 14                 # signatures kept this long after last seen upstream
+SEEN_MAX_ENTRIES = 50_000          # hard cap on the seen-index size
+POLL_MIN_SEC = 120                 # --daemon: fastest per-feed poll interval
+POLL_MAX_SEC = 1800                #           slowest per-feed poll interval
+POLL_START_SEC = 600               #           interval before any history exists
+POLL_BACKOFF = 1.5                 #           interval *= this after a quiet poll
+POLL_SPEEDUP = 0.5                 #           interval *= this after a poll with new entries
+NEAR_DUP_NGRAM = 2                 # character shingle size (bigrams suit Japanese without a tokenizer)
+NEAR_DUP_PERM = 96                 # MinHash signature length
+NEAR_DUP_BANDS = 32                # LSH bands (rows per band = PERM / BANDS)
+NEAR_DUP_THRESHOLD = 0.45          # estimated Jaccard at/above which two items are one story
+NEAR_DUP_RECENT_HOURS = 36         # only items published this recently are clustered
+NEAR_DUP_SUMMARY_CHARS = 80        # summary prefix mixed into the shingles with the title
+NEAR_DUP_TITLE_WEIGHT = 3          # each title shingle counts this many times against the summary's
+NEAR_DUP_MAX_CANDIDATES = 8        # LSH candidates verified per item (most shared bands first)
+NEAR_DUP_BUCKET_CAP = 64           # LSH buckets holding more clusters than this are skipped
+JST = timezone(timedelta(hours=9), "JST")   # no DST in Japan; a fixed offset avoids pytz
 # ------------------------------------------
 
+# ---------- per-stage profiling (--profile) ----------
+try:
+    import resource
+except ImportError:   # not on Windows
+    resource = None
+
+class Profile:
+    """Accumulates wall time and counters per pipeline stage. Recording is always
+    on (a perf_counter pair per call site); --profile just prints report()."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+
+    def add(self, stage, sec, n=1):
+        st = self.stages.setdefault(stage, {"sec": 0.0, "n": 0})
+        st["sec"] += sec
+        st["n"] += n
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name, n=1):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t, n)
+
+    def report(self):
+        out = {"stages": {k: {"sec": round(v["sec"], 6), "n": v["n"]} for k, v in self.stages.items()},
+               "counters": dict(self.counters)}
+        if resource is not None:
+            scale = 1 if sys.platform == "darwin" else 1024   # ru_maxrss: bytes on macOS, KiB elsewhere
+            out["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+            out["peak_rss_children_bytes"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        return out
+
+PROFILE = Profile()
+
+def _timed(fn, *args):
+    # module-level so it pickles into the parse process pool
+    t = time.perf_counter()
+    return fn(*args), time.perf_counter() - t
+# ------------------------------------------------------
+
 def load_config(path: str):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+@lru_cache(maxsize=4096)
 def normalize_dt(dt_str: str):
+    """Parse a feed date string to JST: ISO 8601 / RFC 822 fast paths, dateutil last."""
     if not dt_str:
         return None
+    dt_str = dt_str.strip()
+    dt = None
     try:
-        dt = dtparse.parse(dt_str)
-        if not dt.tzinfo:
-            dt = pytz.utc.localize(dt)
-        return dt.astimezone(JST)
-    except Exception:
-        return None
+        if dt_str[:4].isdigit():
+            dt = datetime.fromisoformat(dt_str)
+        else:
+            dt = parsedate_to_datetime(dt_str)
+    except (TypeError, ValueError, IndexError):
+        try:
+            dt = dtparse.parse(dt_str)
+        except Exception:
+            return None
+    if not dt.tzinfo:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(JST)
+
+def entry_dt(e):
+    """Publish time of a parsed entry in JST, or None if it has no usable date."""
+    for key in ("published_parsed", "updated_parsed"):
+        st = e.get(key)   # struct_time (UTC) from feedparser, or a list once round-tripped via the cache
+        if st:
+            return datetime(*st[:6], tzinfo=timezone.utc).astimezone(JST)
+    return normalize_dt(e.get("published") or e.get("updated"))
 
 def make_guid(text: str) -> str:
     return hashlib.sha1(text.encode("utf-8")).hexdigest()
@@ -34,54 +129,605 @@ def shorten(s: str, n: int):
     s = (s or "").strip()
     return s if len(s) <= n else s[: max(0, n - 1)].rstrip() + "…"
 
+# ---------- concurrent fetch / parse ----------
+class _TimeoutHandler(urllib.request.BaseHandler):
+    # feedparser's opener has no timeout knob; stamp one on every request it builds
+    def __init__(self, timeout):
+        self.timeout = timeout
+    def http_request(self, req):
+        req.timeout = self.timeout
+        return req
+    https_request = http_request
+
+def fetch_feed(feed, timeout, state=None):
+    """Download one feed body. Returns (bytes or None, response meta)."""
+    url, meta = feed["url"], {}
+    state = state or {}
+    try:
+        if re.match(r"(https?|feed):", url):
+            # only ask for a 304 when we still hold the entries to reuse
+            cond = state.get("entries") is not None
+            data = fp_http.get(url, state.get("etag") if cond else None,
+                               state.get("modified") if cond else None,
+                               handlers=[_TimeoutHandler(timeout)], result=meta)
+        else:
+            with open(url, "rb") as f:   # local file (fixtures / offline runs)
+                data = f.read()
+    except Exception as ex:
+        print(f"Fetch failed {url}: {ex}")
+        return None, meta
+    return data, meta
+
+ENTRY_KEYS = ("title", "summary", "link", "published", "updated", "published_parsed", "updated_parsed")
+
+def _slim_entry(e):
+    # only what collect_items reads; keeps the cache small and JSON-safe
+    return feedparser.FeedParserDict({k: e[k] for k in ENTRY_KEYS if k in e})
+
+def parse_body(data, headers, href):
+    headers = dict(headers or {})
+    headers.setdefault("content-location", href)   # keep relative links resolvable
+    return [_slim_entry(e) for e in feedparser.parse(data, response_headers=headers).entries]
+
+def body_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+# ---- conditional-GET state (ETag / Last-Modified / body hash / entries) per feed URL ----
+def load_http_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_http_cache(path, cache, cfg):
+    live = {f["url"] for f in cfg["feeds"]}
+    for url in [u for u in cache if u not in live]:   # feed removed from config.json
+        del cache[url]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _cached_entries(state):
+    return [feedparser.FeedParserDict(e) for e in state.get("entries") or []]
+
+def _fetch_worker(jobs):
+    # plain daemon threads rather than a ThreadPoolExecutor, whose workers are joined at
+    # interpreter exit: a fetch abandoned past its deadline must not hold up shutdown
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        fut, fn, args = job
+        if not fut.set_running_or_notify_cancel():
+            continue
+        fut.started = time.monotonic()
+        try:
+            fut.set_result(fn(*args))
+        except Exception as ex:
+            fut.set_exception(ex)
+
+def _start_fetch_worker(jobs):
+    threading.Thread(target=_fetch_worker, args=(jobs,), daemon=True).start()
+
+def fetch_all(cfg, http_cache=None):
+    """Fetch + parse every feed concurrently; returns entry lists in cfg["feeds"] order.
+
+    A feed still downloading after its deadline (fetch.deadline / feed.deadline)
+    counts as a failed fetch; its worker is abandoned and replaced.
+
+    When ``http_cache`` (a dict from load_http_cache) is given, feeds are fetched
+    with If-None-Match / If-Modified-Since and a 304 or unchanged body reuses the
+    cached entries without parsing. The dict is updated in place.
+    """
+    fc = cfg.get("fetch") or {}
+    feeds = cfg["feeds"]
+    cache = http_cache if http_cache is not None else {}
+    conc = max(1, min(int(fc.get("concurrency", FETCH_CONCURRENCY)), len(feeds) or 1))
+    workers = int(fc.get("parse_workers", PARSE_WORKERS))
+    big = int(fc.get("process_parse_min_bytes", PARSE_PROCESS_MIN_BYTES))
+    deadlines = [f.get("deadline", fc.get("deadline", FETCH_DEADLINE)) for f in feeds]
+    results = [[] for _ in feeds]
+    jobs, started = queue.SimpleQueue(), conc
+    for _ in range(conc):
+        _start_fetch_worker(jobs)
+    fetches = {}
+    for i, f in enumerate(feeds):
+        fut = Future()
+        fut.started = None
+        fetches[fut] = i
+        jobs.put((fut, _timed, (fetch_feed, f, f.get("timeout", fc.get("timeout", FETCH_TIMEOUT)),
+                                cache.get(f["url"]))))
+    procs = None
+    try:
+        with ThreadPoolExecutor(max_workers=conc) as io:
+            parses = {}
+            pending = set(fetches)
+            while pending:
+                # sleep until the next fetch completes or the earliest running one overruns
+                now = time.monotonic()
+                left = min(deadlines[fetches[p]] - (now - p.started if p.started else 0) for p in pending)
+                done, pending = wait(pending, timeout=max(0.0, left), return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for fut in [p for p in pending if p.started and now - p.started >= deadlines[fetches[p]]]:
+                    pending.discard(fut)
+                    print(f"Fetch failed {feeds[fetches[fut]]['url']}: no response within "
+                          f"{deadlines[fetches[fut]]}s")
+                    PROFILE.count("fetch_deadline")
+                    _start_fetch_worker(jobs)   # the stuck worker keeps its thread; restore the slot
+                    started += 1
+                for fut in done:
+                    i = fetches[fut]
+                    url = feeds[i]["url"]
+                    (data, meta), sec = fut.result()
+                    PROFILE.add("fetch", sec)
+                    PROFILE.count("fetched_bytes", len(data or b""))
+                    state = cache.get(url) or {}
+                    if meta.get("status") == 304 and state.get("entries") is not None:
+                        PROFILE.count("http_304")
+                        results[i] = _cached_entries(state)
+                        continue
+                    if not data:
+                        continue
+                    digest = body_hash(data)
+                    if digest == state.get("body_hash") and state.get("entries") is not None:
+                        PROFILE.count("body_unchanged")
+                        # refresh validators so the next poll can get a 304 again
+                        state["etag"], state["modified"] = meta.get("etag"), meta.get("modified")
+                        results[i] = _cached_entries(state)
+                        continue
+                    cache[url] = {"etag": meta.get("etag"), "modified": meta.get("modified"),
+                                  "body_hash": digest, "entries": None}
+                    args = (data, meta.get("headers"), meta.get("href", url))
+                    if workers > 0 and len(data) >= big:
+                        procs = procs or ProcessPoolExecutor(max_workers=workers)
+                        parses[procs.submit(_timed, parse_body, *args)] = i
+                        PROFILE.count("parsed_in_process")
+                    else:
+                        parses[io.submit(_timed, parse_body, *args)] = i
+            for fut, i in parses.items():
+                url = feeds[i]["url"]
+                try:
+                    results[i], sec = fut.result()
+                    PROFILE.add("parse", sec, len(results[i]))
+                    cache[url]["entries"] = results[i]
+                except Exception as ex:
+                    print(f"Parse failed {url}: {ex}")
+                    cache.pop(url, None)
+    finally:
+        for _ in range(started):   # idle workers exit; abandoned ones exit when their fetch ends
+            jobs.put(None)
+        if procs:
+            procs.shutdown()
+    return results
+# ----------------------------------------------
+
+# ---------- sport registry ----------
+_BALL_GATE = r"\bvs\b|対|試合|スタメン|先発|ハイライト|結果|スコア"
+# the four sports built in before config.json had a "sports" block; used when it has none
+DEFAULT_SPORTS = {
+    "npb":     {"label": "NPB",    "file": "npb.xml",     "gate": _BALL_GATE},
+    "jleague": {"label": "Jリーグ", "file": "jleague.xml", "gate": _BALL_GATE},
+    "keiba":   {"label": "競馬",    "file": "keiba.xml",   "gate": "出走|枠順|結果|払戻|確定|レース|予想"},
+    "mlb":     {"label": "MLB",    "file": "mlb.xml",     "gate": _BALL_GATE},
+}
+
+def sport_registry(cfg):
+    """config.json "sports" (+ any sport a feed names), with defaults filled in.
+
+    Each spec: label, file (per-sport output name, None = no own file), emoji,
+    include / exclude (filter pattern lists) and gate (one regex every item must
+    hit, or None). Configs without "sports" get DEFAULT_SPORTS plus their
+    emoji_by_sport / filters.<sport>, and no own file for other sports, as before.
+    Sports may share a file; feed.xml is reserved for the combined feed (ValueError).
+    """
+    legacy_emoji = cfg.get("emoji_by_sport") or {}
+    legacy_flt = cfg.get("filters") or {}
+    specs = cfg.get("sports")
+    legacy = specs is None
+    if legacy:
+        specs = DEFAULT_SPORTS
+    reg = {}
+    names = list(specs) + [f["sport"] for f in cfg.get("feeds", [])]
+    for sport in names:
+        if sport in reg:
+            continue
+        spec = specs.get(sport) or {}
+        flt = legacy_flt.get(sport) if isinstance(legacy_flt.get(sport), dict) else {}
+        reg[sport] = {
+            "label": spec.get("label", sport.upper()),
+            "file": spec.get("file", None if legacy else f"{sport}.xml"),
+            "emoji": spec.get("emoji", legacy_emoji.get(sport, "🎲")),
+            "include": spec.get("include", flt.get("include", [])),
+            "exclude": spec.get("exclude", flt.get("exclude", [])),
+            "gate": spec.get("gate"),
+        }
+    clash = [s for s, spec in reg.items() if spec["file"] and os.path.normpath(spec["file"]) == "feed.xml"]
+    if clash:
+        raise ValueError(f"sports {', '.join(clash)}: file feed.xml is reserved for the combined feed")
+    return reg
+
 # ---------- match-only filters ----------
-def compile_filters(cfg, sport):
-    root = cfg.get("filters") or {}
-    flt  = root.get(sport, {})
-    inc = [re.compile(p, re.IGNORECASE) for p in flt.get("include", [])]
-    exc = [re.compile(p, re.IGNORECASE) for p in flt.get("exclude", [])]
-    return root.get("mode","off"), inc, exc
-
-def looks_like_match(cfg, sport, title, summary):
-    mode, inc, exc = compile_filters(cfg, sport)
-    if mode != "match_only":
+_FILTER_CACHE = {}
+
+_BACKREF = re.compile(r"\\(?:[1-9]|g<)|\(\?P=")
+
+class _AnyOf:
+    """search() over separately compiled patterns; for lists that cannot be folded."""
+    def __init__(self, regexes):
+        self.regexes = regexes
+    def search(self, text):
+        for r in self.regexes:
+            m = r.search(text)
+            if m is not None:
+                return m
+        return None
+
+def _alternation(patterns, flags=re.IGNORECASE):
+    # fold a pattern list into one regex so each entry is scanned once, not once per pattern
+    if not patterns:
+        return None
+    regexes = [re.compile(p, flags) for p in patterns]   # invalid patterns fail here, as before
+    if len(regexes) == 1:
+        return regexes[0]
+    if not any(_BACKREF.search(p) for p in patterns):   # group numbers shift once folded
+        try:
+            return re.compile("|".join(f"(?:{p})" for p in patterns), flags)
+        except re.error:   # e.g. inline global flags like (?i) mid-expression
+            pass
+    return _AnyOf(regexes)
+
+def build_filters(cfg):
+    """Compile the filter engine for cfg; memoized per hash of the filter config.
+
+    Returns {"mode": str, "sports": {sport: (include_re, exclude_re, gate_re)}};
+    any of the three regexes may be None (= no constraint).
+    """
+    reg = sport_registry(cfg)
+    mode = (cfg.get("filters") or {}).get("mode", "off")
+    rules = {k: (v["include"], v["exclude"], v["gate"]) for k, v in reg.items()}
+    key = hashlib.sha1(json.dumps([mode, rules], sort_keys=True).encode("utf-8")).hexdigest()
+    engine = _FILTER_CACHE.get(key)
+    if engine is None:
+        sports = {sport: (_alternation(inc), _alternation(exc), _alternation([gate] if gate else []))
+                  for sport, (inc, exc, gate) in rules.items()}
+        engine = _FILTER_CACHE[key] = {"mode": mode, "sports": sports}
+    return engine
+
+def passes_filters(engine, sport, title, summary):
+    if engine["mode"] != "match_only":
         return True
+    rules = engine["sports"].get(sport)
+    if rules is None:
+        return True
+    inc, exc, gate = rules
     text = f"{title} {summary}"
-    if inc and not any(r.search(text) for r in inc):
-        return False
-    if exc and any(r.search(text) for r in exc):
-        return False
-    if sport in ("npb","mlb","jleague") and not re.search(r"\bvs\b|対|試合|スタメン|先発|ハイライト|結果|スコア", text, re.I):
-        return False
-    if sport == "keiba" and not re.search(r"出走|枠順|結果|払戻|確定|レース|予想", text):
-        return False
-    return True
+    return ((inc is None or inc.search(text) is not None)
+            and (exc is None or exc.search(text) is None)
+            and (gate is None or gate.search(text) is not None))
 # ----------------------------------------
 
-def collect_items(cfg):
+# ---------- persistent seen-index ----------
+def item_sig(link, title):
+    return (link or "") + "||" + title
+
+class SeenIndex:
+    """Cross-run record of published item signatures (SQLite, sha1 keys).
+
+    An item is "live" for live_hours after it was first seen; afterwards it is
+    suppressed even if the source keeps listing it. Rows not seen upstream for
+    ttl_days, or beyond max_entries (oldest first), are evicted by compact().
+    """
+    def __init__(self, path, live_hours=SEEN_LIVE_HOURS, ttl_days=SEEN_TTL_DAYS,
+                 max_entries=SEEN_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen ("
+                        "sig BLOB PRIMARY KEY, first_seen REAL NOT NULL, last_seen REAL NOT NULL"
+                        ") WITHOUT ROWID")
+        self.db.execute("CREATE INDEX IF NOT EXISTS seen_last ON seen(last_seen)")
+        self.live = live_hours * 3600
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+
+    @classmethod
+    def from_config(cls, cfg, root):
+        sc = cfg.get("seen_index") or {}
+        return cls(os.path.join(root, cfg.get("cache_dir", ".cache"), "seen.sqlite"),
+                   sc.get("live_hours", SEEN_LIVE_HOURS), sc.get("ttl_days", SEEN_TTL_DAYS),
+                   sc.get("max_entries", SEEN_MAX_ENTRIES))
+
+    @staticmethod
+    def _key(sig):
+        return hashlib.sha1(sig.encode("utf-8")).digest()
+
+    def first_seen(self, sig):
+        row = self.db.execute("SELECT first_seen FROM seen WHERE sig=?", (self._key(sig),)).fetchone()
+        return row[0] if row else None
+
+    def expired(self, first_seen, now):
+        return first_seen is not None and first_seen < now - self.live
+
+    def touch(self, sig, now):
+        """Record sig as present upstream at now; returns its first_seen."""
+        key = self._key(sig)
+        self.db.execute("INSERT INTO seen VALUES (?,?,?) "
+                        "ON CONFLICT(sig) DO UPDATE SET last_seen=excluded.last_seen", (key, now, now))
+        return self.db.execute("SELECT first_seen FROM seen WHERE sig=?", (key,)).fetchone()[0]
+
+    def compact(self, now):
+        self.db.execute("DELETE FROM seen WHERE last_seen < ?", (now - self.ttl,))
+        self.db.execute("DELETE FROM seen WHERE sig IN (SELECT sig FROM seen ORDER BY last_seen DESC "
+                        "LIMIT -1 OFFSET ?)", (self.max_entries,))
+        self.db.commit()
+
+    def close(self, now=None):
+        self.compact(time.time() if now is None else now)
+        self.db.close()
+
+def apply_seen_index(index, items, now=None):
+    """Drop items whose first sighting is older than the live window; stamp first_seen."""
+    now = time.time() if now is None else now
+    live = []
+    for it in items:
+        sig = item_sig(it["link"], it["raw_title"])
+        if index.expired(index.first_seen(sig), now):
+            index.touch(sig, now)
+            continue
+        it["first_seen"] = index.touch(sig, now)
+        live.append(it)
+    return live
+# -------------------------------------------
+
+# ---------- near-duplicate clustering ----------
+_NORMALIZE_DROP = re.compile(r"[\W_]+")
+_MINHASH_MAX = 1 << 32
+
+def _dup_norm(s):
+    # NFKC folds full/half-width variants; punctuation and spaces carry no signal
+    return _NORMALIZE_DROP.sub("", unicodedata.normalize("NFKC", s).lower())
+
+def dup_text(title, summary, summary_chars=NEAR_DUP_SUMMARY_CHARS):
+    """(title, summary prefix), normalized for NearDupIndex.signature."""
+    return _dup_norm(title), _dup_norm((summary or "")[:summary_chars])
+
+class NearDupIndex:
+    """Incremental near-duplicate clusters over character n-gram shingles.
+
+    Signatures are one-permutation MinHash (each shingle hashed once with crc32
+    and binned, empty bins densified from their right neighbour), so signing is
+    linear in the text length. Title shingles enter title_weight times (crc32
+    seeded per copy), so a shared summary cannot outvote different titles. LSH bands bucket signatures per group (sport);
+    an item joins the most similar of the few clusters sharing the most buckets
+    with it, so an add costs O(bands + bucket hits), not O(items). Each cluster
+    keeps only its best item (lowest rank).
+    """
+    def __init__(self, ngram=NEAR_DUP_NGRAM, num_perm=NEAR_DUP_PERM, bands=NEAR_DUP_BANDS,
+                 threshold=NEAR_DUP_THRESHOLD, title_weight=NEAR_DUP_TITLE_WEIGHT):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.n, self.k, self.bands, self.rows = ngram, num_perm, bands, num_perm // bands
+        self.threshold = threshold
+        self.title_weight = max(1, title_weight)
+        self.buckets = {}     # (group, band, band values) -> [cluster id]
+        self.clusters = []    # [signature, rank, payload, size]
+
+    @classmethod
+    def from_config(cls, cfg):
+        nc = cfg.get("near_dup") or {}
+        if not nc.get("enabled", True):
+            return None
+        return cls(nc.get("ngram", NEAR_DUP_NGRAM), nc.get("num_perm", NEAR_DUP_PERM),
+                   nc.get("bands", NEAR_DUP_BANDS), nc.get("threshold", NEAR_DUP_THRESHOLD),
+                   nc.get("title_weight", NEAR_DUP_TITLE_WEIGHT))
+
+    def clusterable(self, title, summary=""):
+        """False when neither part yields a shingle (empty, symbol-only or 1-char text):
+        such items would all share one signature and collapse into a single cluster."""
+        return len(title) >= self.n or len(summary) >= self.n
+
+    def signature(self, title, summary=""):
+        k, n = self.k, self.n
+        sig = [_MINHASH_MAX] * k
+        for text, copies in ((title, self.title_weight), (summary, 1)):
+            for i in range(len(text) - n + 1):
+                sh = text[i:i + n].encode("utf-8")
+                for seed in range(copies):
+                    h = zlib.crc32(sh, seed)
+                    b, v = h % k, h // k
+                    if v < sig[b]:
+                        sig[b] = v
+        if _MINHASH_MAX in sig and any(v != _MINHASH_MAX for v in sig):
+            # densify: an empty bin borrows the next filled bin's value, offset by distance
+            filled = [v != _MINHASH_MAX for v in sig]
+            out = sig[:]
+            for b in range(k):
+                if not filled[b]:
+                    d = 1
+                    while not filled[(b + d) % k]:
+                        d += 1
+                    out[b] = sig[(b + d) % k] + d * _MINHASH_MAX
+            sig = out
+        return tuple(sig)
+
+    def similarity(self, a, b):
+        return sum(map(operator.eq, a, b)) / self.k
+
+    def add(self, group, title, summary, rank, payload):
+        """Cluster one item (texts from dup_text, clusterable). Returns (cluster id,
+        True if it is now the cluster's best)."""
+        sig = self.signature(title, summary)
+        keys = [(group, i, sig[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+        shared = {}
+        for key in keys:
+            ids = self.buckets.get(key, ())
+            if len(ids) > NEAR_DUP_BUCKET_CAP:   # a band every story shares says nothing
+                continue
+            for cid in ids:
+                shared[cid] = shared.get(cid, 0) + 1
+        best, best_sim = None, self.threshold
+        # verify only the clusters sharing the most bands; keeps an add near-constant time
+        for cid in heapq.nlargest(NEAR_DUP_MAX_CANDIDATES, shared, key=shared.get):
+            sim = self.similarity(sig, self.clusters[cid][0])
+            if sim >= best_sim:
+                best, best_sim = cid, sim
+        if best is None:
+            best = len(self.clusters)
+            self.clusters.append([sig, rank, payload, 1])
+            is_best = True
+        else:
+            c = self.clusters[best]
+            c[3] += 1
+            is_best = rank < c[1]
+            if is_best:
+                c[0], c[1], c[2] = sig, rank, payload
+        for key in keys:   # members' buckets too, so near variants of any member find the cluster
+            ids = self.buckets.setdefault(key, [])
+            if not ids or ids[-1] != best:
+                ids.append(best)
+        return best, is_best
+
+    def representatives(self):
+        """(rank, payload, cluster size) of each cluster's best item."""
+        return [(c[1], c[2], c[3]) for c in self.clusters]
+# -------------------------------------------------
+
+def collect_items(cfg, http_cache=None, seen_index=None, per_sport=None):
+    with PROFILE.stage("fetch_parse_wall"):
+        entry_lists = fetch_all(cfg, http_cache)
+    return items_from_entries(cfg, entry_lists, seen_index, per_sport)
+
+def items_from_entries(cfg, entry_lists, seen_index=None, per_sport=None):
+    """Filter, dedup and sort parsed entries (one list per cfg["feeds"] item).
+
+    With per_sport, only the per_sport newest items of each sport are kept, via a
+    bounded min-heap per sport, so memory and sort cost do not grow with the feeds.
+    Recent items are first clustered by NearDupIndex (config "near_dup") and only
+    each cluster's best item is kept. A summary prefix that repeats within one
+    feed is boilerplate and is left out of the clustering text.
+    """
+    def has_room(sport, key):
+        if per_sport is None:
+            return True
+        h = heaps.get(sport) or []
+        return len(h) < per_sport or bool(h) and key > h[0][0]
+
+    def offer(key, item):
+        if per_sport is None:
+            items.append(item)
+            return
+        h = heaps.setdefault(item["sport"], [])
+        if len(h) < per_sport:
+            heapq.heappush(h, (key, item))
+        else:
+            heapq.heapreplace(h, (key, item))
+
     seen, items = set(), []
-    for feed in cfg["feeds"]:
-        parsed = feedparser.parse(feed["url"])
-        for e in parsed.entries:
+    heaps, seq = {}, 0
+    engine = build_filters(cfg)
+    now = time.time()
+    near = NearDupIndex.from_config(cfg)
+    nc = cfg.get("near_dup") or {}
+    recent = datetime.fromtimestamp(now - 3600 * nc.get("recent_hours", NEAR_DUP_RECENT_HOURS), JST)
+    summary_chars = nc.get("summary_chars", NEAR_DUP_SUMMARY_CHARS)
+    undated = 0
+    clock = time.perf_counter
+    t_dedup = t_filter = t_dates = t_near = 0.0
+    n_entries = n_filtered = n_accepted = 0
+    for feed, entries in zip(cfg["feeds"], entry_lists):
+        n_entries += len(entries)
+        boilerplate = ()
+        if near is not None:
+            prefixes = Counter(getattr(e, "summary", "").strip()[:summary_chars] for e in entries)
+            boilerplate = {p for p, c in prefixes.items() if c > 1}
+        for e in entries:
+            t0 = clock()
             title = getattr(e, "title", "").strip()
             summary = getattr(e, "summary", "").strip() if hasattr(e,"summary") else ""
             link = getattr(e, "link", "").strip()
-            if not looks_like_match(cfg, feed["sport"], title, summary):
-                continue
-            sig = (link or "") + "||" + title
+            sig = item_sig(link, title)
             if sig in seen:
+                t_dedup += clock() - t0
+                continue
+            first = now
+            if seen_index is not None:
+                first = seen_index.first_seen(sig)
+                if seen_index.expired(first, now):   # published in an earlier window; skip the filters
+                    seen.add(sig)
+                    seen_index.touch(sig, now)
+                    t_dedup += clock() - t0
+                    continue
+            t1 = clock()
+            n_filtered += 1
+            ok = passes_filters(engine, feed["sport"], title, summary)
+            t2 = clock()
+            t_filter += t2 - t1
+            if not ok:
+                t_dedup += t1 - t0
                 continue
             seen.add(sig)
-            items.append({
+            if seen_index is not None:
+                first = seen_index.touch(sig, now)
+            t3 = clock()
+            t_dedup += (t1 - t0) + (t3 - t2)
+            published = entry_dt(e)
+            t_dates += clock() - t3
+            date_guessed = published is None
+            if date_guessed:
+                # no parseable date: use when we first saw it, which is stable across runs
+                undated += 1
+                published = datetime.fromtimestamp(first, JST)
+            n_accepted += 1
+            sport = feed["sport"]
+            # newest first, ties keep feed order (same as a stable full sort)
+            key, seq = (published, -seq), seq + 1
+            clustered = False
+            if near is not None and published >= recent:
+                dup = dup_text(title, "" if summary[:summary_chars] in boilerplate else summary, summary_chars)
+                clustered = near.clusterable(*dup)
+            if not clustered and not has_room(sport, key):
+                continue
+            item = {
                 "raw_title": title,
                 "summary": summary,
                 "link": link or feed["url"],
-                "published": normalize_dt(e.get("published") or e.get("updated")) or datetime.now(JST),
-                "sport": feed["sport"],
+                "published": published,
+                "date_guessed": date_guessed,
+                "sport": sport,
                 "bet_url": feed["target_url"],
-                "source_name": feed.get("name", feed["sport"].upper())
-            })
-    items.sort(key=lambda x: x["published"], reverse=True)
+                "source_name": feed.get("name", sport.upper()),
+                "first_seen": first
+            }
+            if clustered:
+                # one slot per story: the cluster's best item (feed priority, then earliest) competes later
+                t4 = clock()
+                near.add(sport, *dup, (-feed.get("priority", 0), published, -key[1]), (key, item))
+                t_near += clock() - t4
+                continue
+            offer(key, item)
+    if near is not None:
+        reps = near.representatives()
+        PROFILE.add("near_dup", t_near, len(near.clusters))
+        PROFILE.count("near_dup_dropped", sum(size - 1 for _, _, size in reps))
+        for _, (key, item), size in reps:
+            item["cluster_size"] = size
+            if has_room(item["sport"], key):
+                offer(key, item)
+    PROFILE.add("dedup", t_dedup, n_entries)
+    PROFILE.add("filter", t_filter, n_filtered)
+    PROFILE.add("dates", t_dates, n_accepted)
+    PROFILE.count("items", n_accepted)
+    PROFILE.count("undated", undated)
+    if undated:
+        print(f"{undated} item(s) had no parseable date; dated by first-seen time")
+    with PROFILE.stage("sort", n_accepted):
+        if per_sport is None:
+            items.sort(key=lambda x: x["published"], reverse=True)
+        else:
+            kept = sorted((kv for h in heaps.values() for kv in h), key=lambda kv: kv[0], reverse=True)
+            items = [it for _, it in kept]
     return items
 
 def collect_demo_items(cfg, per_sport=PER_SPORT_CAP_DEFAULT, run_id=""):
@@ -108,103 +754,291 @@ def collect_demo_items(cfg, per_sport=PER_SPORT_CAP_DEFAULT, run_id=""):
     items.sort(key=lambda x: x["published"], reverse=True)
     return items
 
-def write_feed(outpath, channel_title, self_link, channel_desc, items, emoji_map,
-               guid_suffix="", limit_per_sport=PER_SPORT_CAP_DEFAULT, cta_text="ベットはこちら"):
-    # cap per-sport to reduce spam
-    capped, cnt = [], {}
-    for it in items:
-        k=it["sport"]; cnt[k]=cnt.get(k,0)+1
-        if cnt[k] <= limit_per_sport:
-            capped.append(it)
+# ---------- streaming RSS writer ----------
+RSS_HEAD = ("<?xml version='1.0' encoding='UTF-8'?>\n"
+            '<rss xmlns:atom="http://www.w3.org/2005/Atom" version="2.0">\n'
+            "  <channel>\n")
+RSS_TAIL = "  </channel>\n</rss>\n"
+# outside the XML 1.0 Char production (C0 controls other than tab/LF/CR, surrogates, U+FFFE/FFFF)
+_XML_ILLEGAL = re.compile("[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+
+def xml_text(s):
+    """Escape s for element content, dropping characters no XML parser accepts."""
+    return xml_escape(_XML_ILLEGAL.sub("", s))
 
-    fg = FeedGenerator()
-    fg.id(self_link)
-    fg.title(channel_title)
-    fg.link(href=self_link, rel='self')
-    fg.language("ja")
-    fg.description(channel_desc)
+def xml_attr(s):
+    """Quoted attribute value, dropping characters no XML parser accepts."""
+    return quoteattr(_XML_ILLEGAL.sub("", s))
 
-    jp = {"npb":"NPB","jleague":"Jリーグ","keiba":"競馬","mlb":"MLB"}
+def render_item(it, sports, guid_suffix="", cta_text="ベットはこちら"):
+    sport = it["sport"]
+    spec = sports.get(sport) or {}
+    sport_label = spec.get("label", sport.upper())
+    emoji = spec.get("emoji", "🎲")
 
-    for it in capped:
-        sport = it["sport"]
-        sport_label = jp.get(sport, sport.upper())
-        emoji = emoji_map.get(sport, "🎲")
+    # ITEM TITLE shown by MEE6 (feed title is hidden via config): "⚾ [NPB] <short title>"
+    display_title = f"{emoji} [{sport_label}] {shorten(it['raw_title'], TITLE_MAX)}"
+    summary_short = shorten(it["summary"], DESC_MAX)
 
-        # ITEM TITLE shown by MEE6 (feed title is hidden via config): "⚾ [NPB] <short title>"
-        display_title = f"{emoji} [{sport_label}] {shorten(it['raw_title'], TITLE_MAX)}"
-        summary_short = shorten(it["summary"], DESC_MAX)
+    # IMPORTANT: no <link> element, to avoid image previews/unfurls
+    # CTA first; article shown as markdown link (clickable, but no image unfurl)
+    cta_top = f"👉 __**[{cta_text}]({it['bet_url']})**__"
+    article_md = f"📰 **[記事を読む]({it['link']})**"
 
-        fe = fg.add_entry()
-        fe.id(make_guid(it["link"]+"||"+it["raw_title"]+"||"+guid_suffix))
-        fe.title(display_title)
+    desc_lines = [cta_top]
+    if summary_short:
+        desc_lines.append(summary_short)
+    desc_lines.append(article_md)
 
-        # IMPORTANT: do NOT set fe.link(...) to avoid image previews/unfurls
-        # fe.link(href=it["link"])
+    guid = make_guid(it["link"]+"||"+it["raw_title"]+"||"+guid_suffix)
+    description = "\n\n".join(desc_lines)
+    return ("    <item>\n"
+            f"      <title>{xml_text(display_title)}</title>\n"
+            f"      <description>{xml_text(description)}</description>\n"
+            f'      <guid isPermaLink="false">{guid}</guid>\n'
+            f"      <pubDate>{format_datetime(it['published'])}</pubDate>\n"
+            "    </item>\n")
 
-        # CTA first; article shown as markdown link (clickable, but no image unfurl)
-        cta_top = f"👉 __**[{cta_text}]({it['bet_url']})**__"
-        article_md = f"📰 **[記事を読む]({it['link']})**"
+class FeedSink:
+    """One RSS output: streams into <path>.tmp while hashing, then replaces <path>
+    atomically only if the bytes differ from what is already there."""
+    def __init__(self, path, title, self_link, desc, sports=None):
+        self.path, self.sports, self.count = path, sports, 0
+        self.channel = (title, self_link, desc)
+        self.hash = hashlib.sha1()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.tmp = path + ".tmp"
+        self.f = open(self.tmp, "wb")
+        self.head_written = False
 
-        desc_lines = [cta_top]
-        if summary_short:
-            desc_lines.append(summary_short)
-        desc_lines.append(article_md)
+    def _write(self, s):
+        b = s.encode("utf-8")
+        self.hash.update(b)
+        self.f.write(b)
 
-        fe.description("\n\n".join(desc_lines))
-        fe.pubDate(it["published"])
+    def _head(self, last_build):
+        title, link, desc = self.channel
+        self._write(RSS_HEAD +
+                    f"    <title>{xml_text(title)}</title>\n"
+                    f"    <link>{xml_text(link)}</link>\n"
+                    f"    <description>{xml_text(desc)}</description>\n"
+                    f'    <atom:link href={xml_attr(link)} rel="self"/>\n'
+                    "    <docs>http://www.rssboard.org/rss-specification</docs>\n"
+                    "    <language>ja</language>\n" +
+                    (f"    <lastBuildDate>{format_datetime(last_build)}</lastBuildDate>\n" if last_build else ""))
+        self.head_written = True
 
-    os.makedirs(os.path.dirname(outpath), exist_ok=True)
-    fg.rss_file(outpath, pretty=True, encoding="utf-8")
-    print(f"Wrote {outpath} ({len(capped)} items)")
+    def add(self, it, fragment):
+        if not self.head_written:
+            # items arrive newest first; lastBuildDate follows content so unchanged feeds hash equal
+            self._head(it["published"])
+        self._write(fragment)
+        self.count += 1
+
+    def close(self):
+        """Finish the document; returns True if the file on disk changed."""
+        if not self.head_written:
+            self._head(None)
+        self._write(RSS_TAIL)
+        self.f.close()
+        try:
+            with open(self.path, "rb") as f:
+                unchanged = hashlib.sha1(f.read()).digest() == self.hash.digest()
+        except OSError:
+            unchanged = False
+        if unchanged:
+            os.remove(self.tmp)
+            print(f"Unchanged {self.path} ({self.count} items)")
+            return False
+        os.replace(self.tmp, self.path)
+        print(f"Wrote {self.path} ({self.count} items)")
+        return True
+
+def write_feeds(sinks, items, sports, guid_suffix="", limit_per_sport=PER_SPORT_CAP_DEFAULT,
+                cta_text="ベットはこちら"):
+    """Single pass over items (newest first): each item is rendered at most once and
+    streamed to every sink that takes it (sink.sports None = all sports), capped per
+    sport per sink. Returns the paths whose content changed."""
+    counts = [dict() for _ in sinks]
+    clock = time.perf_counter
+    t_render = t_write = 0.0
+    n_render = n_write = 0
+    try:
+        for it in items:
+            k, fragment = it["sport"], None
+            for sink, cnt in zip(sinks, counts):
+                if sink.sports is not None and k not in sink.sports or cnt.get(k, 0) >= limit_per_sport:
+                    continue
+                cnt[k] = cnt.get(k, 0) + 1
+                t0 = clock()
+                if fragment is None:
+                    fragment = render_item(it, sports, guid_suffix, cta_text)
+                    n_render += 1
+                t1 = clock()
+                sink.add(it, fragment)
+                t_write += clock() - t1
+                t_render += t1 - t0
+                n_write += 1
+    except BaseException:
+        for sink in sinks:
+            sink.f.close()
+            os.remove(sink.tmp)
+        raise
+    with PROFILE.stage("write_close", len(sinks)):
+        changed = [sink.path for sink in sinks if sink.close()]
+    PROFILE.add("render", t_render, n_render)
+    PROFILE.add("write", t_write, n_write)
+    PROFILE.count("outputs_changed", len(changed))
+    return changed
+
+# -------------------------------------------
+
+def feed_sinks(cfg, outdir):
+    """Combined feed.xml plus one file per distinct sport "file" (shared files carry all their sports)."""
+    suppress_title = cfg.get("suppress_channel_title", True)
+    invisible = "\u200B" if suppress_title else None
+    feed_title = cfg.get("feed_title","スポーツ速報（ベットリンク付き）")
+    feed_link = cfg.get("feed_link","https://example.com/feed.xml")
+    base_link = feed_link.rsplit("/",1)[0]
+
+    reg = sport_registry(cfg)   # validates file names before any output is opened
+    sinks = [FeedSink(os.path.join(outdir,"feed.xml"),
+                      invisible if invisible is not None else feed_title,
+                      feed_link, cfg.get("feed_description",""))]
+    by_file = {}   # normalized file name -> (file name as written, [(sport, label)])
+    for sport, spec in reg.items():
+        if spec["file"]:
+            by_file.setdefault(os.path.normpath(spec["file"]), (spec["file"], []))[1].append((sport, spec["label"]))
+    for fname, members in by_file.values():
+        label = "・".join(lb for _, lb in members)
+        title = invisible if invisible is not None else f"{feed_title}｜{label}"
+        desc  = f"{cfg.get('feed_description','')}（{label}のみ）"
+        sinks.append(FeedSink(os.path.join(outdir,fname), title, f"{base_link}/{fname}", desc,
+                              frozenset(s for s, _ in members)))
+    return sinks
+
+# ---------- daemon mode ----------
+def http_cache_path(cfg, root):
+    return os.path.join(root, cfg.get("cache_dir", ".cache"), "http.json")
+
+def next_interval(interval, new_count, lo, hi, backoff=POLL_BACKOFF, speedup=POLL_SPEEDUP):
+    """Adapt a feed's poll interval to its recent activity, clamped to [lo, hi]."""
+    interval = interval * (speedup if new_count else backoff)
+    return max(lo, min(hi, interval))
+
+def run_daemon(cfg, root, per_sport=PER_SPORT_CAP_DEFAULT):
+    """Keep polling: each feed on its own adaptive interval; outputs are rebuilt only
+    when some poll brought entries we had not seen in that feed before."""
+    dc = cfg.get("daemon") or {}
+    feeds = cfg["feeds"]
+    sports = sport_registry(cfg)
+    cta_text = cfg.get("cta",{}).get("text","ベットはこちら")
+    outdir = os.path.join(root,"dist")
+    cache_path = http_cache_path(cfg, root)
+    http_cache = load_http_cache(cache_path)
+    seen_index = SeenIndex.from_config(cfg, root)
+
+    bounds = []
+    for f in feeds:
+        poll = f.get("poll") or {}
+        lo = poll.get("min_interval", dc.get("min_interval", POLL_MIN_SEC))
+        hi = poll.get("max_interval", dc.get("max_interval", POLL_MAX_SEC))
+        bounds.append((lo, hi))
+    intervals = [max(lo, min(hi, dc.get("start_interval", POLL_START_SEC))) for lo, hi in bounds]
+    last_sigs = [None] * len(feeds)          # None = not polled yet in this process
+    backoff = dc.get("backoff", POLL_BACKOFF)
+    speedup = dc.get("speedup", POLL_SPEEDUP)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    schedule = [(0.0, i) for i in range(len(feeds))]   # (due time, feed index); all due at start
+    heapq.heapify(schedule)
+    try:
+        while schedule:
+            time.sleep(max(0.0, schedule[0][0] - time.time()))
+            now = time.time()
+            due = []
+            while schedule and schedule[0][0] <= now:
+                due.append(heapq.heappop(schedule)[1])
+            due.sort()
+            fetched = fetch_all(dict(cfg, feeds=[feeds[i] for i in due]), http_cache)
+
+            rebuild = False
+            for i, entries in zip(due, fetched):
+                sigs = {item_sig(e.get("link", "").strip(), e.get("title", "").strip()) for e in entries}
+                if last_sigs[i] is None:
+                    rebuild = True                        # first poll: no history to adapt on
+                elif sigs:                                # empty = fetch failed; keep history
+                    new = len(sigs - last_sigs[i])
+                    rebuild = rebuild or new > 0
+                    intervals[i] = next_interval(intervals[i], new, *bounds[i], backoff, speedup)
+                if sigs or last_sigs[i] is None:
+                    last_sigs[i] = sigs
+                heapq.heappush(schedule, (now + intervals[i], i))
+
+            if rebuild:
+                entry_lists = [_cached_entries(http_cache.get(f["url"]) or {}) for f in feeds]
+                items = items_from_entries(cfg, entry_lists, seen_index, per_sport)
+                write_feeds(feed_sinks(cfg, outdir), items, sports, "", per_sport, cta_text)
+                seen_index.compact(now)
+            save_http_cache(cache_path, http_cache, cfg)
+            print(f"Polled {len(due)} feed(s); next in {max(0.0, schedule[0][0] - time.time()):.0f}s", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        seen_index.close()
+        save_http_cache(cache_path, http_cache, cfg)
 
 def main():
     ap = argparse.ArgumentParser(description="JP Sports Enriched RSS")
     ap.add_argument("--demo", action="store_true")
     ap.add_argument("--per-sport", type=int, default=PER_SPORT_CAP_DEFAULT)
+    ap.add_argument("--daemon", action="store_true",
+                    help="stay running and poll each feed on its own adaptive interval")
+    ap.add_argument("--profile", nargs="?", const="-", metavar="FILE",
+                    help="emit per-stage timings, counts and peak memory as JSON (to FILE or stdout)")
     args = ap.parse_args()
+    if args.daemon and (args.demo or args.profile):
+        ap.error("--daemon cannot be combined with --demo or --profile")
+    t_start = time.perf_counter()
 
     root = os.path.dirname(os.path.abspath(__file__))
     cfg  = load_config(os.path.join(root,"config.json"))
-    emoji = cfg.get("emoji_by_sport", {})
+    if args.daemon:
+        return run_daemon(cfg, root, args.per_sport)
+    sports = sport_registry(cfg)
     cta_text = cfg.get("cta",{}).get("text","ベットはこちら")
-    suppress_title = cfg.get("suppress_channel_title", True)
-    invisible = "\u200B" if suppress_title else None
 
-    if args.demo:
-        guid = str(int(time.time()))
-        items = collect_demo_items(cfg, per_sport=args.per_sport, run_id=guid)
-    else:
-        guid = ""
-        items = collect_items(cfg)
+    seen_index = SeenIndex.from_config(cfg, root)
+    try:
+        if args.demo:
+            guid = str(int(time.time()))
+            items = apply_seen_index(seen_index,
+                                     collect_demo_items(cfg, per_sport=args.per_sport, run_id=guid))
+        else:
+            guid = ""
+            cache_path = http_cache_path(cfg, root)
+            http_cache = load_http_cache(cache_path)
+            items = collect_items(cfg, http_cache, seen_index, args.per_sport)
+            save_http_cache(cache_path, http_cache, cfg)
+    finally:
+        seen_index.close()
 
-    outdir = os.path.join(root,"dist")
-    os.makedirs(outdir, exist_ok=True)
-
-    # Combined feed
-    combined_title = invisible if invisible is not None else cfg.get("feed_title","スポーツ速報（ベットリンク付き）")
-    write_feed(
-        os.path.join(outdir,"feed.xml"),
-        combined_title,
-        cfg.get("feed_link","https://example.com/feed.xml"),
-        cfg.get("feed_description",""),
-        items, emoji, guid, args.per_sport, cta_text
-    )
-
-    # Per-sport feeds
-    by = {}
-    for it in items:
-        by.setdefault(it["sport"], []).append(it)
-    jp = {"npb":"NPB","jleague":"Jリーグ","keiba":"競馬","mlb":"MLB"}
-    base_link = cfg.get("feed_link","https://example.com/feed.xml").rsplit("/",1)[0]
-
-    files = {"npb":"npb.xml","jleague":"jleague.xml","keiba":"keiba.xml","mlb":"mlb.xml"}
-    for sport, fname in files.items():
-        title = invisible if invisible is not None else f"{cfg.get('feed_title','スポーツ速報（ベットリンク付き）')}｜{jp.get(sport, sport.upper())}"
-        link  = f"{base_link}/{fname}"
-        desc  = f"{cfg.get('feed_description','')}（{jp.get(sport, sport.upper())}のみ）"
-        write_feed(os.path.join(outdir,fname), title, link, desc, by.get(sport, []),
-                   emoji, guid, args.per_sport, cta_text)
+    changed = write_feeds(feed_sinks(cfg, os.path.join(root,"dist")), items,
+                          sports, guid, args.per_sport, cta_text)
+    PROFILE.add("total", time.perf_counter() - t_start)
+
+    if args.profile:
+        report = json.dumps(PROFILE.report(), ensure_ascii=False, indent=2)
+        if args.profile == "-":
+            print(report)
+        else:
+            with open(args.profile, "w", encoding="utf-8") as f:
+                f.write(report + "\n")
+
+    # let the Pages workflow skip the deploy when nothing changed
+    if os.environ.get("GITHUB_OUTPUT"):
+        with open(os.environ["GITHUB_OUTPUT"], "a", encoding="utf-8") as f:
+            f.write(f"changed={'true' if changed else 'false'}\n")
 
 if __name__ == "__main__":
     main()